@@ -1,5 +1,10 @@
 import serial
 import time
+from functools import reduce
+from operator import xor
+
+STX = b'\x02'  # start of text character
+ETX = b'\x03'  # end of text character
 
 class PanTiltController:
     def __init__(self, ID):
@@ -22,19 +27,12 @@ class PanTiltController:
         return Status
     
     def calcLRC(self, data):
-        lrc = bytes.fromhex('00')  # Initialize LRC value to zero
-        print(f"DATA: {data}")
-        bytedata = [int(d) for d in data]
-        print(f"INT DATA: {bytedata}")
-        for byte in bytedata:
-            print(f"BYTE: {(byte)[2:].zfill(8)} for byte: {byte}")  # Print binary representation of each byte
-            lrc ^= byte
-        print(f"LRC: {bin(lrc)[2:].zfill(8)}")  # Print binary representation of the final LRC value
+        lrc = reduce(xor, data, 0)  # XOR of every byte, done in C
         return bytes([lrc])  # Return LRC value as a byte
 
     def send(self, cmd):
         
-        self.serial.write(bytes.fromhex('02')) # Send Start
+        self.serial.write(STX) # Send Start
         self.serial.write(bytes.fromhex(self.ID)) # Send ID
 
         if data is not None:
@@ -48,5 +46,5 @@ class PanTiltController:
             self.serial.write(command)
             self.serial.write(self.calculate_lrc(command))
 
-        self.serial.write(self.ETX)
+        self.serial.write(ETX)
         time.sleep(0.005)
\ No newline at end of file
@@ -1,95 +1,213 @@
+import logging
+import os
 import serial
+import struct
+import sys
 import time
+from contextlib import contextmanager
+from functools import reduce
+from operator import xor
+
+STX = b'\x02'             # start of text character
+ETX = b'\x03'             # end of text character
+ACK = b'\x06'             # acknowledge character
+ESC = b'\x1b'             # escape character
+CONTROL_CHARS = b'\x02\x03\x06\x15\x1b'  # STX, ETX, ACK, NAK, ESC
+CMD_GET_STATUS = b'\x31'   # get status; control byte 0x01 also resets faults
+CMD_MOVE = b'\x33'
+
+MIN_TX_GAP = 0.005          # minimum time between commands, in seconds
+BAUDRATE = 9600
+RESPONSE_CHARS = 20         # longest reply we wait for, with some slack
+LINK_LATENCY = 0.05         # FTDI latency timer (up to 16 ms) plus controller turnaround
+
+PAN_TILT = struct.Struct('<hh')  # pan/tilt as signed little-endian 16-bit
+
+logger = logging.getLogger(__name__)
+
+class CommunicationError(Exception):
+    """The controller did not answer a command after every retry."""
 
 class PTC_Controller:
     
-    def __init__(self, name: str = "Pan Tilt Controller Object", Identity: str = bytes.fromhex('00')) -> None :
+    MAX_CMD_RETRIES = 3  # attempts per command before giving up
+
+    def __init__(self, name: str = "Pan Tilt Controller Object", Identity: str = b'\x00') -> None :
         self.name: str = name
         self.identity: str = Identity
         com_port = 'COM5' # change to your COM port number
-        self.serial = serial.Serial(com_port, baudrate=9600, timeout=1)  
-        self.STX = bytes.fromhex('02') #start of text character
-        self.ETX = bytes.fromhex('03') #end of text character
+        self.serial = serial.Serial(com_port, baudrate=BAUDRATE, timeout=1)
+        self._set_low_latency()
+        self.STX = STX
+        self.ETX = ETX
+        self._last_tx = 0.0
+        self._tx_buf = None  # set while inside batch()
+        self._header = STX + self._escape(self.identity)  # frame start is fixed per controller
+        # Packets with no variable data are built once here and reused
+        self._FAULT_RESET_PACKET = self._build_command(CMD_GET_STATUS, b'\x01\x00\x00\x00\x00')
+        self._STATUS_PACKET = self._build_command(CMD_GET_STATUS, b'\x00\x00\x00\x00\x00')
+        self._HOME_PACKET = self._build_command(CMD_MOVE, b'\x00\x00\x00\x00')
+        # A status round trip is the request and reply on the wire (10 bits
+        # per character) plus adapter latency and controller turnaround
+        self._status_timeout = (len(self._STATUS_PACKET) + RESPONSE_CHARS) * 10 / BAUDRATE + LINK_LATENCY
         print(f"{self.name} initialized")
     
     def calculate_lrc(self, data):
-        lrc = 0b00000000  # Initialize LRC value to zero
-        for byte in data:
-            print(f"BYTE: {bin(byte)[2:].zfill(8)} for byte: {byte}")  # Print binary representation of each byte
-            lrc ^= byte
-        print("DATA: ", data)
-        print("LRC: ", bin(lrc)[2:].zfill(8))  # Print binary representation of the final LRC value
+        lrc = reduce(xor, data, 0)  # XOR of every byte, done in C
         return bytes([lrc])  # Return LRC value as a byte
     
     def calculate_lrc_hex(self, data):
-        lrc = bytes.fromhex('00')  # Initialize LRC value to zero
-        print(f"DATA: {data}")
-        bytedata = [int(d) for d in data]
-        print(f"INT DATA: {bytedata}")
-        for byte in bytedata:
-            print(f"BYTE: {(byte)[2:].zfill(8)} for byte: {byte}")  # Print binary representation of each byte
-            lrc ^= byte
-        print(f"LRC: {bin(lrc)[2:].zfill(8)}")  # Print binary representation of the final LRC value
-        return bytes([lrc])  # Return LRC value as a byte
+        # data is a list of hex strings, e.g. ['31','01','00','00','00','00']
+        return self.calculate_lrc(bytes.fromhex(''.join(data)))
     
+    def _set_low_latency(self):
+        # Best effort: ask the driver to hand received bytes up right away
+        # instead of batching them, which matters for request/response traffic
+        if sys.platform.startswith('linux'):
+            self._set_ftdi_latency_timer()
+        try:
+            self.serial.set_low_latency_mode(True)  # POSIX only
+        except (AttributeError, OSError, ValueError) as err:
+            logger.debug("Could not set low latency mode on %s: %s", self.serial.name, err)
+
+    def _set_ftdi_latency_timer(self):
+        # FTDI adapters hold received bytes for latency_timer ms (16 by
+        # default) before passing them on; drop it to 1 ms if we're allowed
+        # resolve /dev/serial/by-id/... symlinks to the real ttyUSBn name
+        tty = os.path.basename(os.path.realpath(self.serial.name))
+        latency_timer = f"/sys/bus/usb-serial/devices/{tty}/latency_timer"
+        if not os.path.exists(latency_timer):
+            return  # not an FTDI/usb-serial device
+        try:
+            with open(latency_timer, 'w') as f:
+                f.write('1')
+        except OSError as err:
+            logger.warning("Could not set %s to 1 ms (%s); responses may be delayed "
+                           "by up to 16 ms. Run as root or add a udev rule to set it.",
+                           latency_timer, err)
+
+    def _wait_for_tx_gap(self):
+        # Only sleep for whatever is left of the gap since the last command
+        delta = time.monotonic() - self._last_tx
+        if delta < MIN_TX_GAP:
+            time.sleep(MIN_TX_GAP - delta)
+
+    def _write(self, packet: bytes):
+        if self._tx_buf is not None:
+            self._tx_buf += packet
+            return
+        self._wait_for_tx_gap()
+        self.serial.write(packet)
+        self._last_tx = time.monotonic()
+
+    @contextmanager
+    def batch(self):
+        # Queue every packet sent inside the with block and write them all at
+        # once on exit. Commands that wait for a reply (get_status) can't be
+        # used in here, since their request wouldn't go out until the end.
+        if self._tx_buf is not None:
+            yield self  # nested batch: the outermost one owns the buffer and flushes
+            return
+        self._tx_buf = bytearray()
+        try:
+            yield self
+            packets = bytes(self._tx_buf)
+        finally:
+            self._tx_buf = None
+        if packets:
+            self._write(packets)
+
+    def _escape(self, data: bytes) -> bytes:
+        # Control characters inside a frame are sent as ESC followed by the
+        # character with bit 7 set, so the controller doesn't see them as framing
+        if len(data.translate(None, CONTROL_CHARS)) == len(data):
+            return data  # nothing to escape, the usual case
+        escaped = bytearray()
+        for byte in data:
+            if byte in CONTROL_CHARS:
+                escaped += ESC
+                escaped.append(byte | 0x80)
+            else:
+                escaped.append(byte)
+        return bytes(escaped)
+
+    def _build_packet(self, cmd_byte: bytes, payload: bytes) -> bytes:
+        return b''.join((self._header, cmd_byte, self._escape(payload), ETX))
+
+    def _build_command(self, cmd_byte: bytes, data: bytes) -> bytes:
+        return self._build_packet(cmd_byte, data + self.calculate_lrc(cmd_byte + data))
+
     def fault_reset(self):
-        self.serial.write(self.STX)             # Send Start
-        self.serial.write(self.identity)        # Send ID
-        self.serial.write(bytes.fromhex('31'))  # Send Command
-        self.serial.write(bytes.fromhex('01'))  # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))  # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))  # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))  # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))  # Send Sub-Command
-        self.serial.write(bytes.fromhex('30'))  # Send End Command
-        self.serial.write(self.ETX)             # Send End Character
+        self._write(self._FAULT_RESET_PACKET)
     
     def move_to(self, Pan: int=0, Tilt: int=0):
-        self.serial.write(self.STX)             # Send Start
-        self.serial.write(self.identity)        # Send ID
-        self.serial.write(bytes.fromhex('33'))  # Send Command
-        FluffPan = hex(Pan)[2:].zfill(4)
-        FluffTilt = hex(Tilt)[2:].zfill(4)
-        self.serial.write(bytes.fromhex(FluffPan[2:]))   # Send Sub-Command
-        self.serial.write(bytes.fromhex(FluffPan[0:2]))   # Send Sub-Command
-        self.serial.write(bytes.fromhex(FluffTilt[2:]))   # Send Sub-Command
-        self.serial.write(bytes.fromhex(FluffTilt[0:2]))   # Send Sub-Command
-        self.serial.write(bytes.fromhex('57'))  # Send End Command
-        self.serial.write(self.ETX)             # Send End Character
+        data = PAN_TILT.pack(Pan, Tilt)
+        self._write(self._build_command(CMD_MOVE, data))
     
     def move_to_abs_0(self):
-        self.serial.write(self.STX)             # Send Start
-        self.serial.write(self.identity)        # Send ID
-        self.serial.write(bytes.fromhex('33'))  # Send Command
-        self.serial.write(bytes.fromhex('00'))   # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))   # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))   # Send Sub-Command
-        self.serial.write(bytes.fromhex('00'))   # Send Sub-Command
-        self.serial.write(bytes.fromhex('33'))  # Send End Command
-        self.serial.write(self.ETX)             # Send End Character
+        self._write(self._HOME_PACKET)
+
+    def _is_reply_to(self, rx: bytes, cmd_byte: bytes) -> bool:
+        # A reply starts ACK, identity, command; the ACK + identity prefix is
+        # the same length as our STX + identity header
+        cmd_index = len(self._header)
+        return rx[cmd_index:cmd_index + 1] == cmd_byte
+
+    def get_status(self):
+        if self._tx_buf is not None:
+            raise RuntimeError("get_status can't be called inside batch(); its request "
+                               "would not be sent until the batch ends")
+        for _ in range(self.MAX_CMD_RETRIES):
+            # Replies to earlier moves/fault resets, or a late reply to the
+            # previous attempt, are never read; drop them right before sending
+            # (after the TX gap wait) so we don't hand one back as the status
+            self._wait_for_tx_gap()
+            self.serial.reset_input_buffer()
+            self._write(self._STATUS_PACKET)
+            # Anything else that still slips in is skipped, rather than
+            # resending and clearing the buffer while our reply is arriving
+            deadline = time.monotonic() + self._status_timeout
+            remaining = self._status_timeout
+            while remaining > 0:
+                rx = self.receive(timeout=remaining)
+                if rx is not None and self._is_reply_to(rx, CMD_GET_STATUS):
+                    return rx
+                remaining = deadline - time.monotonic()
+        raise CommunicationError(f"no response to get_status after {self.MAX_CMD_RETRIES} tries")
         
     def send_data(self, command, data):
 
-        self.serial.write(self.STX)      # Send Start
-        self.serial.write(self.identity) # Send ID
-
-        if data is not None:
+        # command/data may be passed as hex strings or already as bytes
+        if isinstance(command, str):
             command = bytes.fromhex(command)
+        if isinstance(data, str):
             data = bytes.fromhex(data)
-            self.serial.write(command)
-            self.serial.write(data)
-            self.serial.write(self.calculate_lrc(command + data))
-        else:
-            command = bytes.fromhex(command)
-            self.serial.write(command)
-            self.serial.write(self.calculate_lrc(command))
 
-        self.serial.write(self.ETX)
-        time.sleep(0.005)
+        self._write(self._build_command(command, data or b''))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sent command %s data %s", command.hex(), data.hex() if data else None)
     
     def read(self, ammount):
         self.data = self.serial.read(ammount)
 
+    def receive(self, timeout=None):
+        # A response is ACK ... ETX; pull the whole frame in one read_until
+        # call instead of one read per byte
+        if timeout is None:
+            rx = self.serial.read_until(ETX)
+        else:
+            default_timeout = self.serial.timeout
+            self.serial.timeout = timeout
+            try:
+                rx = self.serial.read_until(ETX)
+            finally:
+                self.serial.timeout = default_timeout
+        start = rx.find(ACK)
+        if start < 0 or not rx.endswith(ETX):
+            return None  # timed out or got a NAK
+        self.data = rx[start:]
+        return self.data
+
 
 
 # c = PTC_Controller()
@@ -1,43 +1,47 @@
+import logging
 import serial
 import time
-def calculate_lrc(data):
-    lrc = 0b00000000  # Initialize LRC value to zero
-    for byte in data:
-        print("BYTE: ", bin(byte)[2:].zfill(8))  # Print binary representation of each byte
-        lrc ^= byte
-    print("DATA: ", data)
-    print("LRC: ", bin(lrc)[2:].zfill(8))  # Print binary representation of the final LRC value
-    return bytes([lrc])  # Return LRC value as a byte
+from functools import reduce
+from operator import xor
 
+STX =      b'\x02' #start of text character
+ETX =      b'\x03' #end of text character
+Identity = b'\x00' #identity if only one device 
 
-def send_data(ser, command, data=None):
-    STX =      bytes.fromhex('02') #start of text character
-    ETX =      bytes.fromhex('03') #end of text character
-    Identity = bytes.fromhex('00') #identity if only one device 
+logger = logging.getLogger(__name__)
 
+MIN_TX_GAP = 0.005  # minimum time between commands, in seconds
+_last_tx = 0.0
 
-    ser.write(STX)
-    ser.write(Identity) 
+def calculate_lrc(data):
+    lrc = reduce(xor, data, 0)  # XOR of every byte, done in C
+    return bytes([lrc])  # Return LRC value as a byte
 
-    if data is not None:
+
+def send_data(ser, command, data=None):
+    global _last_tx
+    if isinstance(command, str):
         command = bytes.fromhex(command)
+    if isinstance(data, str):
         data = bytes.fromhex(data)
-        ser.write(command)
-        ser.write(data)
-        ser.write(calculate_lrc(command + data))
-    else:
-        command = bytes.fromhex(command)
-        ser.write(command)
-        ser.write(calculate_lrc(command))
 
-    ser.write(ETX)
-    time.sleep(0.005)
+    # Only sleep for whatever is left of the gap since the last command
+    delta = time.monotonic() - _last_tx
+    if delta < MIN_TX_GAP:
+        time.sleep(MIN_TX_GAP - delta)
+
+    if data is None:
+        data = b''
+    ser.write(b''.join([STX, Identity, command, data, calculate_lrc(command + data), ETX]))
+    _last_tx = time.monotonic()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sent command %s data %s", command.hex(), data.hex() if data else None)
 
 com_port = 'COM6' # change to your COM port number
 ser = serial.Serial(com_port, baudrate=9600, timeout=1)
 
 while True:
-    send_data(ser, '33', None)
+    send_data(ser, b'\x33', None)
     time.sleep(0.5)
     #read data sent back and print
     data = ser.read(2)